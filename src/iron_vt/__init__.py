@@ -1,24 +1,39 @@
-import pathlib
+import importlib
 
-from typing import Union
-
-from .vault import BaseVault, PathLike, Safe, IronVaultError
-from .backend.json_backend import JSONBackend
-from .encryptor import FernetEncryptor
+from typing import TYPE_CHECKING
 
 
 VERSION = "0.1.1"
 
 
-class Vault(BaseVault):
-    def __init__(self, path: Union[str, PathLike] = "./vt", b64_encode: bool = True):
-        backend = JSONBackend(path=pathlib.Path(path), b64_encode=b64_encode)
-        encryptor_cls = FernetEncryptor
-        super().__init__(backend, encryptor_cls)
+# Public names are resolved on first access (PEP 562) so that `import iron_vt`,
+# and with it `iron_vt --version`, stays cheap.
+_LAZY_ATTRS = {
+    "Vault": ".default",
+    "load": ".default",
+    "Safe": ".vault",
+    "IronVaultError": ".vault",
+    "open_bundle": ".bundle",
+}
+
+
+if TYPE_CHECKING:  # coverage: ignore
+    from .default import Vault, load
+    from .vault import Safe, IronVaultError
+    from .bundle import open_bundle
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
 
 
-def load(name: str, key: str, path: Union[str, PathLike] = "./vt"):
-    return Vault(path).load(name, key)
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
 
 
-__all__ = ["Vault", "Safe", "IronVaultError", "VERSION"]
+__all__ = ["Vault", "load", "Safe", "IronVaultError", "VERSION", "open_bundle"]
@@ -1,23 +1,62 @@
+import os
 import json
+import stat
 import pathlib
+import threading
 import dataclasses
 import base64
+import codecs
 import contextlib
 
-from typing import Dict, Literal, TypedDict, Mapping
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    Literal,
+    Mapping,
+    TextIO,
+    Tuple,
+    TypedDict,
+)
 
 
-from iron_vt.vault import IronVaultError, Entry
+from iron_vt.vault import IronVaultError, Entry, EntryIndex
 
 # region IO Helper
 
 _Mode = Literal["rt", "wt"]
 
+_CHUNK_SIZE = 1 << 16
+
+_NEW_FILE_MODE = 0o600
+
 
 @contextlib.contextmanager
-def _open(p: pathlib.Path, mode: _Mode):
-    with p.open(mode=mode) as fp:
-        yield fp
+def _open(p: pathlib.Path, mode: _Mode) -> Iterator[TextIO]:
+    if mode == "rt":
+        with p.open(mode=mode) as fp:
+            yield fp
+        return
+
+    # write beside the target and swap it in, so a safe is never half written;
+    # the new file keeps the mode of the safe it replaces, 0600 for a new one
+    try:
+        file_mode = stat.S_IMODE(p.stat().st_mode)
+    except FileNotFoundError:
+        file_mode = _NEW_FILE_MODE
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, _NEW_FILE_MODE)
+    try:
+        with open(fd, mode=mode) as fp:
+            os.chmod(tmp, file_mode)
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, p)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp.unlink()
+        raise
 
 
 # endregion
@@ -27,15 +66,27 @@ def _open(p: pathlib.Path, mode: _Mode):
 
 
 def _b64decode_field(line: str):
-    return base64.b64decode(line.encode("utf-8"))
+    return base64.b64decode(line)
 
 
 def _b64encode_field(line: bytes):
     return base64.b64encode(line).decode("utf-8")
 
 
-def _b64decode_file(line: str):
-    return base64.b64decode(line.encode("utf-8")).decode("utf-8")
+def _b64decode_file(fp: TextIO, chunk_size: int = _CHUNK_SIZE) -> Iterator[str]:
+    # decode while reading so neither the encoded nor the decoded text is
+    # ever held in full
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    rest = ""
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + "".join(chunk.split())
+        cut = len(chunk) - len(chunk) % 4
+        yield text_decoder.decode(base64.b64decode(chunk[:cut]))
+        rest = chunk[cut:]
+    yield text_decoder.decode(base64.b64decode(rest), final=True)
 
 
 def _b64encode_file(line: str):
@@ -48,52 +99,152 @@ def _b64encode_file(line: str):
 # region JSON Types
 
 
-class JSONEntry(TypedDict):
+class _JSONEntryRequired(TypedDict):
     salt: str
     token: str
 
 
+class JSONEntry(_JSONEntryRequired, total=False):
+    compression: str
+
+
 JSONSafe = Dict[str, JSONEntry]
 
+_JSON_ENTRY_KEYS = {"salt", "token", "compression"}
+
 # endregion
 
 
-def load(path: pathlib.Path, b64_encode: bool):
-    with _open(path, "rt") as fp:
-        if b64_encode:
-            safe_dct: JSONSafe = json.loads(_b64decode_file(fp.read()))
-        else:
-            safe_dct: JSONSafe = json.loads(fp.read())
+# region JSON Conversion
+
 
-    return {
-        name: Entry(
+def _entry_from_json(entry_dct: Any):
+    if (
+        not isinstance(entry_dct, dict)
+        or not _JSON_ENTRY_KEYS >= entry_dct.keys() >= {"salt", "token"}
+        or not all(isinstance(value, str) for value in entry_dct.values())
+    ):
+        raise IronVaultError("invalid safe entry")
+    try:
+        return Entry(
             salt=_b64decode_field(entry_dct["salt"]),
             token=_b64decode_field(entry_dct["token"]),
+            compression=entry_dct.get("compression"),
         )
-        for name, entry_dct in safe_dct.items()
+    except ValueError:
+        raise IronVaultError("invalid safe entry")
+
+
+def _entry_to_json(entry: Entry) -> JSONEntry:
+    # used as json.dumps default, so each JSONEntry only lives while written
+    entry_dct: JSONEntry = {
+        "salt": _b64encode_field(entry.salt),
+        "token": _b64encode_field(entry.token),
     }
+    if entry.compression is not None:
+        entry_dct["compression"] = entry.compression
+    return entry_dct
+
+
+def _read_chunks(fp: TextIO, chunk_size: int = _CHUNK_SIZE) -> Iterator[str]:
+    return iter(lambda: fp.read(chunk_size), "")
+
+
+def _iter_safe(chunks: Iterator[str]) -> Iterator[Tuple[str, Entry]]:
+    """Parse the top level safe object one entry at a time.
+
+    Only the current chunk and the entry being parsed are held as text, so
+    loading never keeps a full copy of the file around.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+
+    def more(size: int):
+        nonlocal buf, pos
+        parts = [buf[pos:]]
+        read = 0
+        for chunk in chunks:
+            parts.append(chunk)
+            read += len(chunk)
+            if read >= size:
+                break
+        if not read:
+            raise IronVaultError("invalid safe file")
+        buf = "".join(parts)
+        pos = 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            more(_CHUNK_SIZE)
+
+    def value():
+        nonlocal pos
+        peek()
+        # each retry parses the value from its start, so read twice as much
+        # every time to keep large entries linear
+        size = _CHUNK_SIZE
+        while True:
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+                return obj
+            except json.JSONDecodeError:
+                # most likely cut off at the end of the chunk
+                more(size)
+                size *= 2
+
+    if peek() != "{":
+        raise IronVaultError("invalid safe file")
+    pos += 1
+    if peek() == "}":
+        return
+    while True:
+        name = value()
+        if not isinstance(name, str) or peek() != ":":
+            raise IronVaultError("invalid safe file")
+        pos += 1
+        yield name, _entry_from_json(value())
+        token = peek()
+        pos += 1
+        if token == "}":
+            return
+        if token != ",":
+            raise IronVaultError("invalid safe file")
+
+
+# endregion
+
+
+def load(path: pathlib.Path, b64_encode: bool) -> "EntryIndex[Entry]":
+    with _open(path, "rt") as fp:
+        chunks = _b64decode_file(fp) if b64_encode else _read_chunks(fp)
+        return EntryIndex(_iter_safe(chunks))
 
 
 def save(path: pathlib.Path, b64_encode: bool, entries: Mapping[str, Entry]):
-    json_entries: JSONSafe = {
-        name: {
-            "salt": _b64encode_field(entry.salt),
-            "token": _b64encode_field(entry.token),
-        }
-        for name, entry in entries.items()
-    }
+    if not isinstance(entries, dict):
+        entries = dict(entries)
+
+    data = json.dumps(entries, indent=4, default=_entry_to_json)
 
     if b64_encode:
-        data = _b64encode_file(json.dumps(json_entries, indent=4))
-    else:
-        data = json.dumps(json_entries, indent=4)
+        data = _b64encode_file(data)
 
     with _open(path, "wt") as fp:
         fp.write(data)
 
 
+def _suffix(b64_encode: bool):
+    return ".b64" if b64_encode else ".json"
+
+
 def safe_path(path: pathlib.Path, safe_name: str, b64_encode: bool):
-    suffix = ".b64" if b64_encode else ".json"
+    suffix = _suffix(b64_encode)
     safe_path = path.joinpath(safe_name).with_suffix(suffix)
     if safe_path.parent != path:
         raise IronVaultError(f"invalid safe name {safe_name}")
@@ -120,3 +271,7 @@ class JSONBackend:
     def exists(self, name: str):
         safe_path = self._safe_path(name)
         return safe_path.exists() and safe_path.is_file()
+
+    def safes(self):
+        suffix = _suffix(self.b64_encode)
+        return sorted(p.stem for p in self.path.glob(f"*{suffix}") if p.is_file())
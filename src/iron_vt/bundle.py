@@ -0,0 +1,234 @@
+"""Sealed, read-only bundles of secrets.
+
+Entries of the sealed safes are named `<safe>/<entry>`. One random data key
+encrypts every entry and is wrapped with the bundle key, so opening costs a
+single key derivation. Layout, little endian:
+
+    header   magic, version, salt, wrapped key size, slot count, entry count
+    wrapped  data key, encrypted with the bundle key
+    slots    (keyed name hash, record offset, record size), open addressing
+    mac      HMAC-SHA256 of everything above
+    records  nonce + AES-GCM(compression, name size, name, secret)
+
+Opening checks the MAC of the index only, and AES-GCM authenticates each
+record as it is read, so opening doesn't touch the records at all.
+"""
+import os
+import mmap
+import hmac
+import struct
+import hashlib
+import pathlib
+
+from typing import Iterable, Optional, Union
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from . import compression
+from .vault import Entry, IronVaultError, PathLike, Safe
+from .encryptor import FernetEncryptor
+
+
+MAGIC = b"IVTB"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sB3x16sIII")
+_SLOT = struct.Struct("<QQI")
+_RECORD = struct.Struct("<BH")
+_NONCE_SIZE = 12
+_MAC_SIZE = 32
+
+# compression methods by their byte in a record, 0 is none
+_METHODS = (None,) + compression.METHODS
+
+
+def _subkey(data_key: bytes, purpose: bytes):
+    return hashlib.blake2b(purpose, key=data_key, digest_size=32).digest()
+
+
+def _name_hash(index_key: bytes, name: str):
+    digest = hashlib.blake2b(name.encode("utf-8"), key=index_key, digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+def seal(
+    path: Union[str, PathLike],
+    key: str,
+    safes: Iterable[Safe],
+    compress: Optional[str] = "zlib",
+) -> None:
+    """Write the entries of safes to a new bundle at path."""
+    path = pathlib.Path(path)
+    safes = list(safes)
+    seen = set()
+    for safe in safes:
+        if safe.name in seen:
+            raise IronVaultError(f"safe {safe.name} given more than once")
+        seen.add(safe.name)
+
+    data_key = AESGCM.generate_key(bit_length=256)
+    wrapped_key = FernetEncryptor(key.encode("utf-8")).encrypt(data_key)
+    salt, wrapped = wrapped_key.salt, wrapped_key.token
+    aead = AESGCM(_subkey(data_key, b"aead"))
+    index_key = _subkey(data_key, b"index")
+
+    entries = {
+        f"{safe.name}/{name}": secret
+        for safe in safes
+        for name, secret in safe.entries.items()
+    }
+    slot_count = 1
+    while slot_count < 2 * len(entries):
+        slot_count *= 2
+
+    offset = _HEADER.size + len(wrapped) + slot_count * _SLOT.size + _MAC_SIZE
+    slots = [(0, 0, 0)] * slot_count
+    records = []
+    for name, secret in entries.items():
+        data, method = compression.compress(secret, compress)
+        encoded_name = name.encode("utf-8")
+        nonce = os.urandom(_NONCE_SIZE)
+        record = nonce + aead.encrypt(
+            nonce,
+            _RECORD.pack(_METHODS.index(method), len(encoded_name))
+            + encoded_name
+            + data,
+            None,
+        )
+
+        name_hash = _name_hash(index_key, name)
+        slot = name_hash % slot_count
+        while slots[slot][2]:
+            slot = (slot + 1) % slot_count
+        slots[slot] = (name_hash, offset, len(record))
+
+        records.append(record)
+        offset += len(record)
+
+    index = b"".join(
+        [
+            _HEADER.pack(MAGIC, VERSION, salt, len(wrapped), slot_count, len(entries)),
+            wrapped,
+            b"".join(_SLOT.pack(*slot) for slot in slots),
+        ]
+    )
+    mac = hmac.new(_subkey(data_key, b"mac"), index, hashlib.sha256).digest()
+
+    # bundles are immutable, so write read only and swap in atomically
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as fp:
+            fp.write(index)
+            fp.write(mac)
+            for record in records:
+                fp.write(record)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+
+
+class Bundle:
+    """Read only view of a sealed bundle, see open_bundle."""
+
+    def __init__(self, path: Union[str, PathLike], key: str):
+        with open(path, "rb") as fp:
+            # mmap can't map an empty file
+            if os.fstat(fp.fileno()).st_size < _HEADER.size + _MAC_SIZE:
+                raise IronVaultError("invalid bundle")
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open(key)
+        except Exception:
+            self._mm.close()
+            raise
+
+    def _open(self, key: str):
+        mm = self._mm
+        header = _HEADER.unpack_from(mm, 0)
+        magic, version, salt, wrapped_size, slot_count, entry_count = header
+        if magic != MAGIC or version != VERSION:
+            raise IronVaultError("invalid bundle")
+        slots_offset = _HEADER.size + wrapped_size
+        mac_offset = slots_offset + slot_count * _SLOT.size
+        if len(mm) < mac_offset + _MAC_SIZE:
+            raise IronVaultError("invalid bundle")
+
+        wrapped = mm[_HEADER.size : _HEADER.size + wrapped_size]
+        try:
+            data_key = FernetEncryptor(key.encode("utf-8")).decrypt(
+                Entry(salt=salt, token=wrapped)
+            )
+        except Exception:
+            raise IronVaultError("invalid bundle key")
+
+        mac_key = _subkey(data_key, b"mac")
+        with memoryview(mm) as view:
+            mac = hmac.new(mac_key, view[:mac_offset], hashlib.sha256).digest()
+        if not hmac.compare_digest(mac, mm[mac_offset : mac_offset + _MAC_SIZE]):
+            raise IronVaultError("bundle failed integrity check")
+
+        self._aead = AESGCM(_subkey(data_key, b"aead"))
+        self._index_key = _subkey(data_key, b"index")
+        self._slots_offset = slots_offset
+        self._slot_count = slot_count
+        self._entry_count = entry_count
+
+    def _lookup(self, name: str) -> Optional[bytes]:
+        name_hash = _name_hash(self._index_key, name)
+        slot = name_hash % self._slot_count
+        for _ in range(self._slot_count):
+            slot_hash, offset, size = _SLOT.unpack_from(
+                self._mm, self._slots_offset + slot * _SLOT.size
+            )
+            if not size:
+                return None
+            if slot_hash == name_hash:
+                record = self._mm[offset : offset + size]
+                try:
+                    plain = self._aead.decrypt(
+                        record[:_NONCE_SIZE], record[_NONCE_SIZE:], None
+                    )
+                except Exception:
+                    raise IronVaultError("bundle failed integrity check")
+                method, name_size = _RECORD.unpack_from(plain, 0)
+                start = _RECORD.size + name_size
+                if plain[_RECORD.size : start] == name.encode("utf-8"):
+                    return compression.decompress(plain[start:], _METHODS[method])
+            slot = (slot + 1) % self._slot_count
+        return None
+
+    def get(self, name: str, default: Optional[str] = None):
+        value = self._lookup(name)
+        if value is None:
+            return default
+        return value.decode("utf-8")
+
+    def __getitem__(self, name: str) -> str:
+        value = self._lookup(name)
+        if value is None:
+            raise KeyError(name)
+        return value.decode("utf-8")
+
+    def __contains__(self, name: str) -> bool:
+        return self._lookup(name) is not None
+
+    def __len__(self) -> int:
+        return self._entry_count
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_bundle(path: Union[str, PathLike], key: str) -> Bundle:
+    return Bundle(path, key)
@@ -2,7 +2,9 @@
 
 Usage:
   iron_vt [--vault=<dir>] [--safe=<name>] [--no-b64] (add|get|del) <name>
-  iron_vt [--vault=<dir>] [--safe=<name>] list
+  iron_vt [--vault=<dir>] [--safe=<name>] [--prefix=<prefix>] list
+  iron_vt [--vault=<dir>] [--safe=<name>] [--no-b64] rekey [--all]
+  iron_vt [--vault=<dir>] [--no-b64] seal <bundle> <safes>...
   iron_vt (-h | --help)
   iron_vt --version
 
@@ -12,34 +14,54 @@ Options:
   --safe=<name>  Safe name [default: safe].
   --vault=<dir>  Vault directory [default: ./vt].
   --no-b64       Don't encode json in base64 [default: False].
+  --prefix=<prefix>  Only list entries starting with prefix [default: ].
+  --all          Rekey every safe in the vault, resuming an interrupted run.
 
 """
 import sys
 import getpass
-from typing import TypedDict, cast, TextIO
+import os.path
+from typing import List, TypedDict, cast, TextIO
 from docopt import docopt
-from . import Vault, VERSION
+from . import VERSION
+
+
+# Progress of `rekey --all`, kept in the vault directory until it completes
+REKEY_JOURNAL = ".rekey.journal"
 
 
 Args = TypedDict(
     "Args",
     {
+        "--all": bool,
         "--help": bool,
         "--no-b64": bool,
+        "--prefix": str,
         "--safe": str,
         "--vault": str,
         "--version": bool,
         "<name>": str,
+        "<bundle>": str,
+        "<safes>": List[str],
         "add": bool,
         "get": bool,
         "del": bool,
         "list": bool,
+        "rekey": bool,
+        "seal": bool,
     },
 )
 
 
+def _open_vault(args: Args):
+    # Imported here so --help and --version don't load the vault machinery
+    from .default import Vault
+
+    return Vault(path=args["--vault"], b64_encode=(not args["--no-b64"]))
+
+
 def get_entry(args: Args, stdout: TextIO, stderr: TextIO):
-    vault = Vault(path=args["--vault"], b64_encode=(not args["--no-b64"]))
+    vault = _open_vault(args)
     if not vault.exists(args["--safe"]):
         print(f"No such safe: {args['--safe']}")
         return
@@ -52,7 +74,7 @@ def get_entry(args: Args, stdout: TextIO, stderr: TextIO):
 
 
 def add_entry(args: Args, stdout: TextIO, stderr: TextIO):
-    vault = Vault(path=args["--vault"], b64_encode=(not args["--no-b64"]))
+    vault = _open_vault(args)
     key = getpass.getpass(f"Key for safe {args['--safe']}: ", stream=stderr)
     if vault.exists(args["--safe"]):
         safe = vault.load(args["--safe"], key)
@@ -66,7 +88,7 @@ def add_entry(args: Args, stdout: TextIO, stderr: TextIO):
 
 
 def del_entry(args: Args, stdout: TextIO, stderr: TextIO):
-    vault = Vault(path=args["--vault"], b64_encode=(not args["--no-b64"]))
+    vault = _open_vault(args)
     if not vault.exists(args["--safe"]):
         print(f"No such safe: {args['--safe']}", file=stderr)
         return
@@ -81,18 +103,66 @@ def del_entry(args: Args, stdout: TextIO, stderr: TextIO):
 
 
 def list_entries(args: Args, stdout: TextIO, stderr: TextIO):
-    vault = Vault(path=args["--vault"], b64_encode=(not args["--no-b64"]))
+    vault = _open_vault(args)
     if not vault.exists(args["--safe"]):
         print(f"No such safe: {args['--safe']}", stderr)
         return
 
     key = getpass.getpass(f"Key for safe {args['--safe']}: ", stream=stderr)
-    safe = vault.load(args["--safe"], key)
+    entries = vault.subtree(args["--safe"], key, args["--prefix"] or "")
 
-    for name in safe.entries:
+    for name in entries:
         print(f"* {name}", file=stdout)
 
 
+def rekey_safes(args: Args, stdout: TextIO, stderr: TextIO):
+    vault = _open_vault(args)
+    if args["--all"]:
+        target = f"vault {args['--vault']}"
+    elif vault.exists(args["--safe"]):
+        target = f"safe {args['--safe']}"
+    else:
+        print(f"No such safe: {args['--safe']}", file=stderr)
+        return
+
+    key = getpass.getpass(f"Key for {target}: ", stream=stderr)
+    new_key = getpass.getpass(f"New key for {target}: ", stream=stderr)
+    if getpass.getpass("Repeat new key: ", stream=stderr) != new_key:
+        print("keys do not match", file=stderr)
+        return
+
+    if args["--all"]:
+        journal = os.path.join(args["--vault"], REKEY_JOURNAL)
+        for name in vault.rekey_all(key, new_key, journal=journal):
+            print(f"* {name}", file=stdout)
+    else:
+        vault.rekey(args["--safe"], key, new_key)
+
+
+def seal_safes(args: Args, stdout: TextIO, stderr: TextIO):
+    from .bundle import seal
+
+    if len(set(args["<safes>"])) != len(args["<safes>"]):
+        print("Each safe can only be sealed once", file=stderr)
+        return
+
+    vault = _open_vault(args)
+    safes = []
+    for name in args["<safes>"]:
+        if not vault.exists(name):
+            print(f"No such safe: {name}", file=stderr)
+            return
+        key = getpass.getpass(f"Key for safe {name}: ", stream=stderr)
+        safes.append(vault.load(name, key))
+
+    key = getpass.getpass(f"Key for bundle {args['<bundle>']}: ", stream=stderr)
+    if getpass.getpass("Repeat bundle key: ", stream=stderr) != key:
+        print("keys do not match", file=stderr)
+        return
+
+    seal(args["<bundle>"], key, safes)
+
+
 def main():
     if __doc__ is None:
         raise Exception("missing docopt help text")
@@ -129,3 +199,17 @@ def main():
         except Exception as e:
             print(e)
         return
+
+    if args["rekey"]:
+        try:
+            rekey_safes(args, stdout, stderr)
+        except Exception as e:
+            print(e)
+        return
+
+    if args["seal"]:
+        try:
+            seal_safes(args, stdout, stderr)
+        except Exception as e:
+            print(e)
+        return
@@ -0,0 +1,56 @@
+import zlib
+import lzma
+
+from typing import Optional, Tuple
+
+
+# Secrets smaller than this are stored as is
+COMPRESS_THRESHOLD = 1024
+
+# Upper bound on a decompressed secret, guards against compression bombs
+MAX_SECRET_SIZE = 64 * 1024 * 1024
+
+METHODS = ("zlib", "lzma")
+
+
+def compress(
+    secret: bytes, method: Optional[str], threshold: int = COMPRESS_THRESHOLD
+) -> Tuple[bytes, Optional[str]]:
+    if method is None or len(secret) < threshold:
+        return secret, None
+
+    if method == "zlib":
+        data = zlib.compress(secret, 9)
+    elif method == "lzma":
+        data = lzma.compress(secret)
+    else:
+        raise ValueError(f"unknown compression {method}")
+
+    if len(data) >= len(secret):
+        return secret, None
+    return data, method
+
+
+def decompress(
+    data: bytes, method: Optional[str], max_size: int = MAX_SECRET_SIZE
+) -> bytes:
+    if method is None:
+        return data
+
+    try:
+        if method == "zlib":
+            zlib_decompressor = zlib.decompressobj()
+            secret = zlib_decompressor.decompress(data, max_size)
+            complete = zlib_decompressor.eof and not zlib_decompressor.unconsumed_tail
+        elif method == "lzma":
+            lzma_decompressor = lzma.LZMADecompressor()
+            secret = lzma_decompressor.decompress(data, max_size)
+            complete = lzma_decompressor.eof
+        else:
+            raise ValueError(f"unknown compression {method}")
+    except (zlib.error, lzma.LZMAError):
+        raise ValueError(f"corrupt {method} compressed entry")
+
+    if not complete:
+        raise ValueError(f"entry exceeds {max_size} bytes when decompressed")
+    return secret
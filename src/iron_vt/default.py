@@ -0,0 +1,23 @@
+import pathlib
+
+from typing import Optional, Union
+
+from .vault import BaseVault, PathLike
+from .backend.json_backend import JSONBackend
+from .encryptor import FernetEncryptor
+
+
+class Vault(BaseVault):
+    def __init__(
+        self,
+        path: Union[str, PathLike] = "./vt",
+        b64_encode: bool = True,
+        compression: Optional[str] = None,
+    ):
+        backend = JSONBackend(path=pathlib.Path(path), b64_encode=b64_encode)
+        encryptor_cls = FernetEncryptor
+        super().__init__(backend, encryptor_cls, compression)
+
+
+def load(name: str, key: str, path: Union[str, PathLike] = "./vt"):
+    return Vault(path).load(name, key)
@@ -3,14 +3,15 @@ import base64
 import dataclasses
 
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-
 from .vault import Entry
 
 
 def _make_fernet(key: bytes, salt: bytes):
+    # cryptography is slow to import, so only pay for it once a key is used
+    from cryptography.fernet import Fernet
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=390000)
     fern_key = base64.urlsafe_b64encode(kdf.derive(key))
     return Fernet(fern_key)
@@ -0,0 +1,366 @@
+"""iron_vt load test.
+
+Runs reader and writer processes against one safe in a shared vault
+directory and reports throughput, latency, errors and lost writes.
+Run it with `python -m iron_vt.loadtest`.
+
+Usage:
+  iron_vt.loadtest [options]
+  iron_vt.loadtest (-h | --help)
+
+Options:
+  -h --help       Show this screen.
+  --readers=<n>   Reader processes [default: 4].
+  --writers=<n>   Writer processes [default: 2].
+  --ops=<n>       Operations per process [default: 100].
+  --mix=<mix>     Writer get:add:del weights [default: 2:1:1].
+  --entries=<n>   Entries in the safe before the run [default: 10].
+  --vault=<dir>   Vault directory, a temporary one if not given.
+  --timeout=<s>   Give up on the workers after this many seconds [default: 600].
+  --no-b64        Don't encode json in base64 [default: False].
+  --plain         Skip encryption to measure only the backend [default: False].
+
+"""
+import os
+import sys
+import time
+import queue
+import random
+import pathlib
+import tempfile
+import contextlib
+import functools
+import dataclasses
+import multiprocessing
+import multiprocessing.process
+import multiprocessing.synchronize
+
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypedDict,
+    TypeVar,
+    cast,
+)
+
+from .vault import Backend, BaseVault, Encryptor, Entry, IronVaultError
+from .backend.json_backend import JSONBackend
+from .encryptor import FernetEncryptor
+
+
+T = TypeVar("T")
+
+BackendFactory = Callable[[pathlib.Path], Backend]
+
+OPS = ("get", "add", "del")
+
+SAFE_NAME = "loadtest"
+SAFE_KEY = "loadtest"
+
+_POLL_INTERVAL = 0.1
+
+
+@dataclasses.dataclass
+class PlainEncryptor:
+    """Stores secrets unencrypted, so a run measures only the backend."""
+
+    key: bytes
+
+    def decrypt(self, entry: Entry):
+        return entry.token
+
+    def encrypt(self, secret: bytes):
+        return Entry(salt=b"", token=secret)
+
+
+@dataclasses.dataclass
+class WorkerResult:
+    latencies: Dict[str, List[float]] = dataclasses.field(
+        default_factory=lambda: {op: [] for op in OPS}
+    )
+    errors: Dict[str, int] = dataclasses.field(
+        default_factory=lambda: {op: 0 for op in OPS}
+    )
+    live: Set[str] = dataclasses.field(default_factory=set)
+    deleted: Set[str] = dataclasses.field(default_factory=set)
+    lost_writes: int = 0
+
+
+@dataclasses.dataclass
+class Report:
+    elapsed: float
+    ops: Dict[str, int]
+    errors: Dict[str, int]
+    p50: Dict[str, float]
+    p99: Dict[str, float]
+    lost_writes: int
+
+    @property
+    def total_ops(self):
+        return sum(self.ops.values())
+
+    @property
+    def ops_per_sec(self):
+        return self.total_ops / self.elapsed if self.elapsed else 0.0
+
+    def format(self):
+        lines = [
+            f"ops: {self.total_ops} in {self.elapsed:.2f}s "
+            f"({self.ops_per_sec:.1f} ops/sec)",
+            f"{'op':<6}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}",
+        ]
+        for op in OPS:
+            lines.append(
+                f"{op:<6}{self.ops[op]:>8}{self.errors[op]:>8}"
+                f"{self.p50[op] * 1000:>10.2f}{self.p99[op] * 1000:>10.2f}"
+            )
+        lines.append(f"lost writes: {self.lost_writes}")
+        return "\n".join(lines)
+
+
+def _percentile(values: List[float], q: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _vault(
+    path: pathlib.Path, backend_factory: BackendFactory, encryptor_cls: Type[Encryptor]
+):
+    return BaseVault(backend_factory(path), encryptor_cls)
+
+
+def _run_op(vault: BaseVault, op: str, worker: str, seq: int, result: WorkerResult):
+    safe = vault.load(SAFE_NAME, SAFE_KEY)
+
+    if op == "get":
+        if safe.entries:
+            safe[random.choice(list(safe.entries))]
+        return
+
+    if op == "add":
+        name = f"{worker}/{seq}"
+        safe.add(name, f"secret {name}")
+        vault.save(safe, SAFE_KEY)
+        result.live.add(name)
+        return
+
+    name = random.choice(sorted(result.live))
+    result.live.discard(name)
+    if name not in safe.entries:
+        # our own add was overwritten by another writer
+        result.lost_writes += 1
+        return
+    del safe[name]
+    vault.save(safe, SAFE_KEY)
+    result.deleted.add(name)
+
+
+def _worker(
+    path: pathlib.Path,
+    backend_factory: BackendFactory,
+    encryptor_cls: Type[Encryptor],
+    worker: str,
+    ops: int,
+    mix: Tuple[int, int, int],
+    ready: "multiprocessing.Queue[str]",
+    start: "multiprocessing.synchronize.Event",
+    results: "multiprocessing.Queue[WorkerResult]",
+):
+    vault = _vault(path, backend_factory, encryptor_cls)
+    result = WorkerResult()
+    ready.put(worker)
+    start.wait()
+    for seq in range(ops):
+        op = random.choices(OPS, weights=mix)[0]
+        if op == "del" and not result.live:
+            op = "add"
+        began = time.perf_counter()
+        try:
+            _run_op(vault, op, worker, seq, result)
+        except Exception:
+            result.errors[op] += 1
+        result.latencies[op].append(time.perf_counter() - began)
+    results.put(result)
+
+
+def count_lost_writes(names: Set[str], results: List[WorkerResult]):
+    """Writes missing from the final safe, plus those observed during the run."""
+    lost = 0
+    for result in results:
+        lost += result.lost_writes
+        lost += len(result.live - names)
+        lost += len(result.deleted & names)
+    return lost
+
+
+def _gather(
+    items: "multiprocessing.Queue[T]",
+    processes: Mapping[str, multiprocessing.process.BaseProcess],
+    deadline: Optional[float],
+) -> List[T]:
+    # poll, so a crashed or hung worker fails the run instead of blocking it
+    gathered: List[T] = []
+    while len(gathered) < len(processes):
+        try:
+            gathered.append(items.get(timeout=_POLL_INTERVAL))
+            continue
+        except queue.Empty:
+            pass
+        crashed = [name for name, process in processes.items() if process.exitcode]
+        if crashed:
+            raise IronVaultError(f"load test workers crashed: {', '.join(crashed)}")
+        if deadline is not None and time.monotonic() > deadline:
+            raise IronVaultError("load test timed out")
+    return gathered
+
+
+def _stop(processes: Mapping[str, multiprocessing.process.BaseProcess]):
+    for process in processes.values():
+        if process.pid is not None and process.is_alive():
+            process.terminate()
+    for process in processes.values():
+        if process.pid is not None:
+            process.join()
+
+
+def run(
+    path: pathlib.Path,
+    readers: int = 4,
+    writers: int = 2,
+    ops: int = 100,
+    mix: Tuple[int, int, int] = (2, 1, 1),
+    entries: int = 10,
+    backend_factory: BackendFactory = JSONBackend,
+    encryptor_cls: Type[Encryptor] = FernetEncryptor,
+    timeout: Optional[float] = 600.0,
+) -> Report:
+    """Load test a vault directory with reader and writer processes.
+
+    backend_factory is called with the vault path in every process, so it has
+    to be picklable, e.g. a Backend class or a functools.partial of one.
+    The run fails if a worker crashes or the workers take longer than timeout
+    seconds. A `loadtest` safe already in the vault is never overwritten.
+    """
+    vault = _vault(path, backend_factory, encryptor_cls)
+    if vault.exists(SAFE_NAME):
+        raise IronVaultError(f"{path} already has a {SAFE_NAME} safe")
+    safe = vault.create(SAFE_NAME)
+    for i in range(entries):
+        safe.add(f"seed/{i}", f"secret {i}")
+    vault.save(safe, SAFE_KEY)
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [(f"reader{i}", (1, 0, 0)) for i in range(readers)]
+    workers += [(f"writer{i}", mix) for i in range(writers)]
+    # the clock starts once every process is up and waiting
+    ready: "multiprocessing.Queue[str]" = ctx.Queue()
+    start = ctx.Event()
+    results: "multiprocessing.Queue[WorkerResult]" = ctx.Queue()
+    processes = {
+        name: ctx.Process(
+            target=_worker,
+            args=(path, backend_factory, encryptor_cls, name, ops, worker_mix),
+            kwargs={"ready": ready, "start": start, "results": results},
+        )
+        for name, worker_mix in workers
+    }
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        for process in processes.values():
+            process.start()
+        _gather(ready, processes, deadline)
+        start.set()
+        began = time.perf_counter()
+        worker_results = _gather(results, processes, deadline)
+        elapsed = time.perf_counter() - began
+    except BaseException:
+        _stop(processes)
+        raise
+    for process in processes.values():
+        process.join()
+
+    final = vault.load(SAFE_NAME, SAFE_KEY)
+
+    latencies = {
+        op: [latency for result in worker_results for latency in result.latencies[op]]
+        for op in OPS
+    }
+    return Report(
+        elapsed=elapsed,
+        ops={op: len(latencies[op]) for op in OPS},
+        errors={op: sum(result.errors[op] for result in worker_results) for op in OPS},
+        p50={op: _percentile(latencies[op], 0.50) for op in OPS},
+        p99={op: _percentile(latencies[op], 0.99) for op in OPS},
+        lost_writes=count_lost_writes(set(final.entries), worker_results),
+    )
+
+
+Args = TypedDict(
+    "Args",
+    {
+        "--help": bool,
+        "--readers": str,
+        "--writers": str,
+        "--ops": str,
+        "--mix": str,
+        "--entries": str,
+        "--vault": Optional[str],
+        "--timeout": str,
+        "--no-b64": bool,
+        "--plain": bool,
+    },
+)
+
+
+def main():
+    from docopt import docopt
+
+    if __doc__ is None:
+        raise Exception("missing docopt help text")
+
+    args = cast(Args, docopt(__doc__))
+
+    mix = tuple(int(weight) for weight in args["--mix"].split(":"))
+    if len(mix) != len(OPS):
+        print("--mix takes get:add:del weights", file=sys.stderr)
+        return
+
+    vault_dir = args["--vault"]
+    with (
+        tempfile.TemporaryDirectory()
+        if vault_dir is None
+        else contextlib.nullcontext(vault_dir)
+    ) as directory:
+        path = pathlib.Path(directory)
+        os.makedirs(path, exist_ok=True)
+        try:
+            report = run(
+                path,
+                readers=int(args["--readers"]),
+                writers=int(args["--writers"]),
+                ops=int(args["--ops"]),
+                mix=cast(Tuple[int, int, int], mix),
+                entries=int(args["--entries"]),
+                backend_factory=functools.partial(
+                    JSONBackend, b64_encode=not args["--no-b64"]
+                ),
+                encryptor_cls=PlainEncryptor if args["--plain"] else FernetEncryptor,
+                timeout=float(args["--timeout"]),
+            )
+        except IronVaultError as e:
+            print(e, file=sys.stderr)
+            return
+
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
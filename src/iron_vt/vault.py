@@ -1,15 +1,30 @@
 import sys
 import os
+import bisect
+import contextlib
 import dataclasses
+import fnmatch
+import pathlib
+
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
     Mapping,
     MutableMapping,
     Protocol,
+    Tuple,
     Type,
+    TypeVar,
     Optional,
+    Union,
 )
 
+from . import compression
+
 
 if sys.version_info >= (3, 8):  # coverage: ignore
     PathLike = os.PathLike[str]
@@ -17,20 +32,126 @@ else:  # coverage: ignore
     PathLike = os.PathLike
 
 
+T = TypeVar("T")
+
+_GLOB_CHARS = "*?["
+
+
 class IronVaultError(RuntimeError):
     pass
 
 
-@dataclasses.dataclass
+class EntryIndex(MutableMapping[str, T]):
+    """Mapping of entry names kept with a sorted name index.
+
+    Iterates in insertion order like a dict, while prefix and glob lookups
+    bisect into the sorted names instead of scanning every entry.
+    """
+
+    def __init__(self, entries: Union[Mapping[str, T], Iterable[Tuple[str, T]]] = ()):
+        self._entries: Dict[str, T] = dict(entries)
+        self._names: List[str] = sorted(self._entries)
+
+    def __getitem__(self, name: str) -> T:
+        return self._entries[name]
+
+    def __setitem__(self, name: str, value: T) -> None:
+        if name not in self._entries:
+            bisect.insort(self._names, name)
+        self._entries[name] = value
+
+    def __delitem__(self, name: str) -> None:
+        del self._entries[name]
+        del self._names[bisect.bisect_left(self._names, name)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._entries!r})"
+
+    def prefix(self, prefix: str) -> Iterator[str]:
+        """Names starting with prefix, in sorted order."""
+        for i in range(bisect.bisect_left(self._names, prefix), len(self._names)):
+            name = self._names[i]
+            if not name.startswith(prefix):
+                break
+            yield name
+
+    def glob(self, pattern: str) -> Iterator[str]:
+        """Names matching a path pattern, in sorted order.
+
+        Patterns are matched one `/` separated segment at a time with fnmatch,
+        so `*` and `?` stay within a segment, while a `**` segment matches
+        any number of segments: `db/*/password`, `db/**`.
+        """
+        literal = pattern
+        for i, char in enumerate(pattern):
+            if char in _GLOB_CHARS:
+                literal = pattern[:i]
+                break
+        if literal == pattern:
+            if pattern in self._entries:
+                yield pattern
+            return
+        pattern_parts = pattern.split("/")
+        for name in self.prefix(literal):
+            if _match_segments(name.split("/"), pattern_parts):
+                yield name
+
+
+def _match_segments(parts: List[str], pattern_parts: List[str]) -> bool:
+    if not pattern_parts:
+        return not parts
+    head, rest = pattern_parts[0], pattern_parts[1:]
+    if head == "**":
+        return any(_match_segments(parts[i:], rest) for i in range(len(parts) + 1))
+    return (
+        bool(parts)
+        and fnmatch.fnmatchcase(parts[0], head)
+        and _match_segments(parts[1:], rest)
+    )
+
+
+@dataclasses.dataclass(init=False)
 class Entry:
+    # slotted, as a large safe holds one of these per secret; __init__ is
+    # written out since a slotted field can't have a class level default
+    __slots__ = ("salt", "token", "compression")
+
     salt: bytes
     token: bytes
+    compression: Optional[str]
+
+    def __init__(self, salt: bytes, token: bytes, compression: Optional[str] = None):
+        self.salt = salt
+        self.token = token
+        self.compression = compression
 
 
 @dataclasses.dataclass
 class Safe:
     name: str
-    entries: MutableMapping[str, bytes] = dataclasses.field(default_factory=dict)
+    entries: MutableMapping[str, bytes] = dataclasses.field(default_factory=EntryIndex)
+
+    def __post_init__(self):
+        if not isinstance(self.entries, EntryIndex):
+            self.entries = EntryIndex(self.entries)
+
+    def _index(self) -> "EntryIndex[bytes]":
+        # entries may have been replaced after init
+        if not isinstance(self.entries, EntryIndex):
+            self.entries = EntryIndex(self.entries)
+        return self.entries
+
+    def find(self, pattern: str) -> Dict[str, str]:
+        return {name: self[name] for name in self._index().glob(pattern)}
+
+    def subtree(self, prefix: str) -> Dict[str, str]:
+        return {name: self[name] for name in self._index().prefix(prefix)}
 
     def add(self, name: str, secret: str):
         self.entries[name] = secret.encode("utf-8")
@@ -66,6 +187,7 @@ class Encryptor(Protocol):
 
 
 class Backend(Protocol):
+    # returning an EntryIndex lets name queries skip sorting the safe
     def load(self, name: str) -> Mapping[str, Entry]:
         ...
 
@@ -75,40 +197,187 @@ class Backend(Protocol):
     def exists(self, name: str) -> bool:
         ...
 
+    def safes(self) -> List[str]:
+        ...
+
 
 @dataclasses.dataclass
 class BaseVault:
     _backend: Backend
     _encryptor_cls: Type[Encryptor]
+    # off by default, as older releases ignore the compression of an entry
+    _compression: Optional[str] = None
+    _compress_threshold: int = compression.COMPRESS_THRESHOLD
+    _max_secret_size: int = compression.MAX_SECRET_SIZE
 
     def exists(self, name: str):
         return self._backend.exists(name)
 
+    def safes(self):
+        return self._backend.safes()
+
     def create(self, name: str):
         return Safe(name)
 
+    def _encrypt(self, encryptor: Encryptor, secret: bytes) -> Entry:
+        try:
+            data, method = compression.compress(
+                secret, self._compression, self._compress_threshold
+            )
+        except ValueError as e:
+            raise IronVaultError(str(e))
+        entry = encryptor.encrypt(data)
+        entry.compression = method
+        return entry
+
+    def _decrypt(self, encryptor: Encryptor, entry: Entry) -> bytes:
+        try:
+            data = encryptor.decrypt(entry)
+        except Exception:
+            raise IronVaultError("invalid safe key")
+        try:
+            return compression.decompress(
+                data, entry.compression, self._max_secret_size
+            )
+        except ValueError as e:
+            raise IronVaultError(str(e))
+
+    def _load_index(self, name: str) -> "EntryIndex[Entry]":
+        encrypted_entries = self._backend.load(name)
+        if isinstance(encrypted_entries, EntryIndex):
+            return encrypted_entries
+        return EntryIndex(encrypted_entries)
+
     def load(self, name: str, key: str) -> Safe:
 
         encrypted_entries = self._backend.load(name)
 
         encryptor = self._encryptor_cls(key.encode("utf-8"))
 
-        try:
-            entries = {
-                name: encryptor.decrypt(entry)
-                for name, entry in encrypted_entries.items()
-            }
-        except Exception:
-            raise IronVaultError("invalid safe key")
+        entries: EntryIndex[bytes] = EntryIndex(
+            (entry_name, self._decrypt(encryptor, entry))
+            for entry_name, entry in encrypted_entries.items()
+        )
 
         return Safe(name=name, entries=entries)
 
+    def _decrypt_names(
+        self, key: str, encrypted_entries: Mapping[str, Entry], names: Iterable[str]
+    ) -> Dict[str, str]:
+        encryptor = self._encryptor_cls(key.encode("utf-8"))
+        secrets = {
+            name: self._decrypt(encryptor, encrypted_entries[name]).decode("utf-8")
+            for name in names
+        }
+        if not secrets:
+            # nothing matched, still reject a wrong key
+            for entry in encrypted_entries.values():
+                self._decrypt(encryptor, entry)
+                break
+        return secrets
+
+    def find(self, name: str, key: str, pattern: str) -> Dict[str, str]:
+        """Decrypt only the entries of a safe whose names match pattern."""
+        encrypted_entries = self._load_index(name)
+        return self._decrypt_names(
+            key, encrypted_entries, encrypted_entries.glob(pattern)
+        )
+
+    def subtree(self, name: str, key: str, prefix: str) -> Dict[str, str]:
+        """Decrypt only the entries of a safe whose names start with prefix."""
+        encrypted_entries = self._load_index(name)
+        return self._decrypt_names(
+            key, encrypted_entries, encrypted_entries.prefix(prefix)
+        )
+
     def save(self, safe: Safe, key: str):
 
         encryptor = self._encryptor_cls(key.encode("utf-8"))
 
         encrypted_entries = {
-            name: encryptor.encrypt(entry) for name, entry in safe.entries.items()
+            name: self._encrypt(encryptor, secret)
+            for name, secret in safe.entries.items()
         }
 
         self._backend.save(safe.name, encrypted_entries)
+
+    def _rekey_entry(
+        self, encryptor: Encryptor, new_encryptor: Encryptor, entry: Entry
+    ):
+        # the decrypted data is still compressed, so it is passed on as is
+        try:
+            data = encryptor.decrypt(entry)
+        except Exception:
+            raise IronVaultError("invalid safe key")
+        new_entry = new_encryptor.encrypt(data)
+        new_entry.compression = entry.compression
+        return new_entry
+
+    def _has_key(self, name: str, key: str):
+        encryptor = self._encryptor_cls(key.encode("utf-8"))
+        for entry in self._backend.load(name).values():
+            try:
+                encryptor.decrypt(entry)
+            except Exception:
+                return False
+            break
+        return True
+
+    def rekey(
+        self, name: str, key: str, new_key: str, workers: Optional[int] = None
+    ) -> None:
+        """Re-encrypt a safe under new_key, running entries in parallel."""
+        encrypted_entries = self._backend.load(name)
+
+        encryptor = self._encryptor_cls(key.encode("utf-8"))
+        new_encryptor = self._encryptor_cls(new_key.encode("utf-8"))
+
+        with ThreadPoolExecutor(workers) as executor:
+            rekeyed = executor.map(
+                lambda entry: self._rekey_entry(encryptor, new_encryptor, entry),
+                encrypted_entries.values(),
+            )
+            entries = dict(zip(encrypted_entries, rekeyed))
+
+        self._backend.save(name, entries)
+
+    def rekey_all(
+        self,
+        key: str,
+        new_key: str,
+        journal: Optional[Union[str, PathLike]] = None,
+        workers: Optional[int] = None,
+    ) -> List[str]:
+        """Re-encrypt every safe under new_key, one safe at a time.
+
+        Finished safes are appended to the journal file, so rerunning after an
+        interruption skips them, as long as they open with new_key. The journal
+        is removed once all safes are done. Returns the names of the safes
+        rekeyed by this call.
+        """
+        journal_path = None if journal is None else pathlib.Path(journal)
+        done = set()
+        if journal_path is not None and journal_path.exists():
+            done = set(journal_path.read_text().splitlines())
+
+        rekeyed: List[str] = []
+        for name in self.safes():
+            # a journal left by a run with another new key is stale
+            if name in done and self._has_key(name, new_key):
+                continue
+            try:
+                self.rekey(name, key, new_key, workers)
+                rekeyed.append(name)
+            except IronVaultError:
+                # died after saving the safe but before journaling it
+                if not self._has_key(name, new_key):
+                    raise
+            if journal_path is not None:
+                with journal_path.open("at") as fp:
+                    fp.write(f"{name}\n")
+
+        if journal_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                journal_path.unlink()
+
+        return rekeyed
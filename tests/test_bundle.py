@@ -0,0 +1,97 @@
+import pathlib
+import pytest
+
+import iron_vt
+
+from iron_vt import bundle
+
+
+@pytest.fixture
+def bundle_path(tmp_path: pathlib.Path):
+    app = iron_vt.Safe("app")
+    app.add("db/prod/password", "SECRET_A")
+    app.add("api/key", "SECRET_B")
+    app.add("pem", "-----BEGIN CERTIFICATE-----\n" + "MIIDdzCCAl+gAwIBAgIE\n" * 200)
+    other = iron_vt.Safe("other")
+    other.add("db/prod/password", "SECRET_C")
+    path = tmp_path / "secrets.bundle"
+    bundle.seal(path, "bundlekey", [app, other, iron_vt.Safe("empty")])
+    return path
+
+
+def test_open_bundle(bundle_path: pathlib.Path):
+    with iron_vt.open_bundle(bundle_path, "bundlekey") as got:
+        assert len(got) == 4
+        assert got["app/db/prod/password"] == "SECRET_A"
+        assert got["app/api/key"] == "SECRET_B"
+        assert got["other/db/prod/password"] == "SECRET_C"
+        assert got["app/pem"].endswith("MIIDdzCCAl+gAwIBAgIE\n")
+        assert "app/api/key" in got
+        assert "app/missing" not in got
+        assert got.get("app/missing", "BACKUP") == "BACKUP"
+        with pytest.raises(KeyError):
+            got["db/prod/password"]
+
+
+def test_seal_read_only(tmp_path: pathlib.Path, bundle_path: pathlib.Path):
+    assert not bundle_path.stat().st_mode & 0o222
+    assert list(tmp_path.iterdir()) == [bundle_path]
+
+
+def test_open_bundle_invalid_key(bundle_path: pathlib.Path):
+    with pytest.raises(iron_vt.IronVaultError):
+        iron_vt.open_bundle(bundle_path, "nokey")
+
+
+def _tamper(tmp_path: pathlib.Path, bundle_path: pathlib.Path, offset: int):
+    data = bytearray(bundle_path.read_bytes())
+    data[offset] ^= 0x01
+    tampered = tmp_path / "tampered.bundle"
+    tampered.write_bytes(bytes(data))
+    return tampered
+
+
+@pytest.mark.parametrize("offset", [30, 200, 350])
+def test_open_bundle_tampered_index(
+    tmp_path: pathlib.Path, bundle_path: pathlib.Path, offset: int
+):
+    with pytest.raises(iron_vt.IronVaultError):
+        iron_vt.open_bundle(_tamper(tmp_path, bundle_path, offset), "bundlekey")
+
+
+@pytest.mark.parametrize("offset", [-1, -40])
+def test_open_bundle_tampered_record(
+    tmp_path: pathlib.Path, bundle_path: pathlib.Path, offset: int
+):
+    # records are only checked when read, the last one is other's password
+    tampered = _tamper(tmp_path, bundle_path, offset)
+    with iron_vt.open_bundle(tampered, "bundlekey") as got:
+        assert got["app/api/key"] == "SECRET_B"
+        with pytest.raises(iron_vt.IronVaultError):
+            got["other/db/prod/password"]
+
+
+def test_open_bundle_not_a_bundle(tmp_path: pathlib.Path):
+    path = tmp_path / "safe.json"
+    path.write_text("{}" * 100)
+    with pytest.raises(iron_vt.IronVaultError):
+        iron_vt.open_bundle(path, "bundlekey")
+
+
+@pytest.mark.parametrize("data", [b"", b"IVTB"])
+def test_open_bundle_too_short(tmp_path: pathlib.Path, data: bytes):
+    path = tmp_path / "empty.bundle"
+    path.write_bytes(data)
+    with pytest.raises(iron_vt.IronVaultError):
+        iron_vt.open_bundle(path, "bundlekey")
+
+
+def test_seal_duplicate_safe(tmp_path: pathlib.Path):
+    path = tmp_path / "dup.bundle"
+    first = iron_vt.Safe("app")
+    first.add("a", "1")
+    second = iron_vt.Safe("app")
+    second.add("b", "2")
+    with pytest.raises(iron_vt.IronVaultError):
+        bundle.seal(path, "bundlekey", [first, second])
+    assert not path.exists()
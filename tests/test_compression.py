@@ -0,0 +1,59 @@
+import random
+import zlib
+import pytest
+
+from iron_vt import compression
+
+
+LARGE_SECRET = b"-----BEGIN CERTIFICATE-----\n" + b"MIIDdzCCAl+gAwIBAgIE" * 200
+
+_rng = random.Random(0)
+RANDOM_SECRET = bytes(_rng.getrandbits(8) for _ in range(2048))
+
+
+@pytest.mark.parametrize("method", ["zlib", "lzma"])
+def test_roundtrip(method: str):
+    data, got_method = compression.compress(LARGE_SECRET, method)
+    assert got_method == method
+    assert len(data) < len(LARGE_SECRET)
+    assert compression.decompress(data, got_method) == LARGE_SECRET
+
+
+@pytest.mark.parametrize(
+    "secret,method",
+    [
+        (b"short secret", "zlib"),
+        (LARGE_SECRET, None),
+        (RANDOM_SECRET, "zlib"),
+    ],
+    ids=["short", "disabled", "incompressible"],
+)
+def test_stored_as_is(secret: bytes, method: str):
+    got = compression.compress(secret, method, threshold=64)
+    assert got == (secret, None)
+    assert compression.decompress(secret, None) == secret
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        compression.compress(LARGE_SECRET, "brotli")
+    with pytest.raises(ValueError):
+        compression.decompress(LARGE_SECRET, "brotli")
+
+
+@pytest.mark.parametrize("method", ["zlib", "lzma"])
+def test_decompress_bomb(method: str):
+    data, _ = compression.compress(bytes(1024 * 1024), method)
+    with pytest.raises(ValueError):
+        compression.decompress(data, method, max_size=1024)
+
+
+def test_decompress_exact_limit():
+    data = zlib.compress(bytes(1024))
+    assert compression.decompress(data, "zlib", max_size=1024) == bytes(1024)
+
+
+@pytest.mark.parametrize("method", ["zlib", "lzma"])
+def test_decompress_corrupt(method: str):
+    with pytest.raises(ValueError):
+        compression.decompress(b"not compressed at all", method)
@@ -0,0 +1,57 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+from typing import Dict
+
+import iron_vt
+
+
+# Cumulative import time allowed for `iron_vt --version`, in microseconds;
+# importing cryptography alone takes about as long
+IMPORT_BUDGET_US = 30_000
+
+
+def _run_version():
+    src = str(pathlib.Path(iron_vt.__file__).parent.parent)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "iron_vt", "--version"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def _parse_importtime(stderr: str) -> Dict[str, int]:
+    # lines look like: "import time:   self [us] | cumulative | imported package"
+    times: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_version_output():
+    got = _run_version()
+    assert got.stdout.strip() == f"Iron Vault {iron_vt.VERSION}"
+
+
+def test_version_skips_crypto():
+    times = _parse_importtime(_run_version().stderr)
+    assert "iron_vt.cli" in times
+    assert not any(name.startswith("cryptography") for name in times)
+    assert "iron_vt.vault" not in times
+
+
+def test_version_import_budget():
+    times = _parse_importtime(_run_version().stderr)
+    got = times["iron_vt"] + times["iron_vt.cli"]
+    assert got < IMPORT_BUDGET_US
@@ -1,5 +1,9 @@
+import io
+import os
+import time
 import pathlib
 import dataclasses
+import tracemalloc
 import pytest
 import unittest.mock
 import unittest
@@ -7,11 +11,19 @@ import unittest
 from typing import Mapping
 
 import iron_vt
+import iron_vt.vault
 
 from iron_vt.backend import json_backend
 from iron_vt.vault import Entry
 
 
+# Peak bytes allocated per entry while loading a large safe
+LOAD_PEAK_PER_ENTRY = 512
+
+# Seconds allowed to load a safe holding one 16 MB entry
+LOAD_LARGE_ENTRY_SECONDS = 2.0
+
+
 @dataclasses.dataclass
 class SafeFixture:
     name: str
@@ -64,13 +76,65 @@ def test_open_read():
 
 def test_open_write():
     m = unittest.mock.mock_open()
-    with unittest.mock.patch("pathlib.Path.open", m):
+    with (
+        unittest.mock.patch("os.open", return_value=3) as mock_os_open,
+        unittest.mock.patch("builtins.open", m),
+        unittest.mock.patch("os.chmod"),
+        unittest.mock.patch("os.fsync") as mock_fsync,
+        unittest.mock.patch("os.replace") as mock_replace,
+    ):
         p = pathlib.Path("dummy")
         with json_backend._open(p, "wt") as fp:  # type: ignore
             fp.write("dummytext")
-    m.assert_called_once_with(mode="wt")
+    m.assert_called_once_with(3, mode="wt")
     handle = m()
     handle.write.assert_called_once_with("dummytext")
+    handle.flush.assert_called_once_with()
+    mock_fsync.assert_called_once_with(handle.fileno())
+    tmp, flags, _ = mock_os_open.call_args.args
+    assert flags & os.O_EXCL
+    assert mock_replace.call_args.args[0] == tmp
+    tmp, target = mock_replace.call_args.args
+    assert tmp.parent == p.parent and tmp.name.startswith(".dummy.")
+    assert target == p
+
+
+def test_open_write_atomic(tmp_path: pathlib.Path):
+    p = tmp_path / "safe.json"
+    p.write_text("old")
+    with pytest.raises(RuntimeError):
+        with json_backend._open(p, "wt") as fp:  # type: ignore
+            fp.write("half written")
+            raise RuntimeError("died")
+    assert p.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [p]
+
+    with json_backend._open(p, "wt") as fp:  # type: ignore
+        fp.write("new")
+    assert p.read_text() == "new"
+    assert list(tmp_path.iterdir()) == [p]
+
+
+def test_open_write_mode(tmp_path: pathlib.Path):
+    p = tmp_path / "safe.json"
+    with json_backend._open(p, "wt") as fp:  # type: ignore
+        fp.write("new")
+    assert p.stat().st_mode & 0o777 == 0o600
+
+    os.chmod(p, 0o640)
+    with json_backend._open(p, "wt") as fp:  # type: ignore
+        fp.write("newer")
+    assert p.stat().st_mode & 0o777 == 0o640
+
+
+@pytest.mark.parametrize("b64_encode", [False, True])
+def test_safes(tmp_path: pathlib.Path, b64_encode: bool):
+    backend = json_backend.JSONBackend(tmp_path, b64_encode=b64_encode)
+    backend.save("b_safe", {})
+    backend.save("a_safe", {})
+    json_backend.JSONBackend(tmp_path, b64_encode=not b64_encode).save("other", {})
+    tmp_path.joinpath("notes.txt").write_text("")
+    assert backend.safes() == ["a_safe", "b_safe"]
 
 
 @pytest.mark.parametrize(
@@ -188,3 +252,106 @@ def test_full_load_b64(valid_test_safe: SafeFixture):
         pathlib.Path(valut_path, valid_test_safe.b64_filename), "rt"
     )
     assert got == valid_test_safe.entries
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4, 7, 1 << 16])
+def test_b64decode_file_chunks(valid_test_safe: SafeFixture, chunk_size: int):
+    b64_file = valid_test_safe.b64_file
+    fp = io.StringIO(b64_file[:30] + "\n" + b64_file[30:] + "\n")
+    got = json_backend._b64decode_file(fp, chunk_size)  # type: ignore
+    assert "".join(got) == valid_test_safe.json_file
+
+
+@pytest.mark.parametrize("b64_encode", [False, True])
+def test_load_peak_memory(tmp_path: pathlib.Path, b64_encode: bool):
+    count = 10000
+    p = tmp_path / "large_safe"
+    json_backend.save(
+        p,
+        b64_encode,
+        {
+            f"entry_{i}": Entry(salt=os.urandom(16), token=os.urandom(120))
+            for i in range(count)
+        },
+    )
+
+    tracemalloc.start()
+    try:
+        got = json_backend.load(p, b64_encode)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert isinstance(got, iron_vt.vault.EntryIndex)
+    assert len(got) == count
+    assert list(got.prefix("entry_999")) == ["entry_999", "entry_9990"] + [
+        f"entry_999{i}" for i in range(1, 10)
+    ]
+    assert peak / count < LOAD_PEAK_PER_ENTRY
+
+
+@pytest.mark.parametrize("b64_encode", [False, True])
+def test_load_large_entry_time(tmp_path: pathlib.Path, b64_encode: bool):
+    # one 16 MB entry took several seconds while it was reparsed per chunk
+    p = tmp_path / "large_entry"
+    entries = {"large": Entry(salt=b"123", token=os.urandom(16 << 20))}
+    json_backend.save(p, b64_encode, entries)
+
+    began = time.perf_counter()
+    got = json_backend.load(p, b64_encode)
+    assert time.perf_counter() - began < LOAD_LARGE_ENTRY_SECONDS
+    assert got == entries
+
+
+@pytest.mark.parametrize("b64_encode", [False, True])
+def test_compression_roundtrip(tmp_path: pathlib.Path, b64_encode: bool):
+    entries = {
+        "plain": Entry(salt=b"123", token=b"456"),
+        "packed": Entry(salt=b"123", token=b"456", compression="zlib"),
+    }
+    p = tmp_path / "compressed_safe"
+    json_backend.save(p, b64_encode, entries)
+    assert json_backend.load(p, b64_encode) == entries
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_iter_safe_chunks(valid_test_safe: SafeFixture, chunk_size: int):
+    fp = io.StringIO(valid_test_safe.json_file)
+    got = json_backend._iter_safe(  # type: ignore
+        json_backend._read_chunks(fp, chunk_size)  # type: ignore
+    )
+    assert dict(got) == valid_test_safe.entries
+
+
+@pytest.mark.parametrize(
+    "json_file",
+    [
+        "{}",
+        ' { "a" : { "token" : "NDU2" , "salt" : "MTIz" } }\n',
+        '{"a": {"salt": "MTIz", "token": "NDU2", "compression": "zlib"}}',
+    ],
+)
+def test_iter_safe_valid(json_file: str):
+    got = dict(json_backend._iter_safe(iter([json_file])))  # type: ignore
+    assert all(isinstance(entry, Entry) for entry in got.values())
+
+
+@pytest.mark.parametrize(
+    "json_file",
+    [
+        "",
+        "[]",
+        '{"a": {"salt": "MTIz"}}',
+        '{"a": {"salt": "MTIz", "token": "NDU2", "extra": "x"}}',
+        '{"a": {"salt": "MTIz", "token": 456}}',
+        '{"a": {"salt": "M", "token": "NDU2"}}',
+        '{"a": {"b": {"salt": "MTIz", "token": "NDU2"}}}',
+        '{"a": "MTIz"}',
+        '{"a" {"salt": "MTIz", "token": "NDU2"}}',
+        '{"a": {"salt": "MTIz", "token": "NDU2"}',
+        '{"a": {"salt": "MTIz", "token": "NDU2"}; "b": {}}',
+    ],
+)
+def test_iter_safe_invalid(json_file: str):
+    with pytest.raises(iron_vt.IronVaultError):
+        dict(json_backend._iter_safe(iter([json_file])))  # type: ignore
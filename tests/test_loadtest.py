@@ -0,0 +1,93 @@
+import os
+import pathlib
+import functools
+import dataclasses
+import multiprocessing
+import pytest
+
+from iron_vt import loadtest
+from iron_vt.backend.json_backend import JSONBackend
+from iron_vt.vault import IronVaultError
+
+
+@dataclasses.dataclass
+class ChildBrokenBackend:
+    """Backend factory that only works in the process that made it."""
+
+    pid: int
+
+    def __call__(self, path: pathlib.Path):
+        if os.getpid() != self.pid:
+            raise RuntimeError("broken backend")
+        return JSONBackend(path, b64_encode=False)
+
+
+def test_count_lost_writes():
+    writer0 = loadtest.WorkerResult(live={"w0/1", "w0/2"}, deleted={"w0/3"})
+    writer1 = loadtest.WorkerResult(live={"w1/1"}, deleted={"w1/2"}, lost_writes=1)
+    names = {"seed/0", "w0/1", "w0/3", "w1/1"}
+    # w0/2 vanished, w0/3 came back after its delete, w1 saw one lost add
+    assert loadtest.count_lost_writes(names, [writer0, writer1]) == 3
+
+
+def test_percentile():
+    values = [0.5, 0.1, 0.4, 0.2, 0.3]
+    assert loadtest._percentile(values, 0.5) == 0.3  # type: ignore
+    assert loadtest._percentile(values, 0.99) == 0.5  # type: ignore
+    assert loadtest._percentile([], 0.5) == 0.0  # type: ignore
+
+
+def test_run(tmp_path: pathlib.Path):
+    report = loadtest.run(
+        tmp_path,
+        readers=1,
+        writers=2,
+        ops=10,
+        mix=(1, 2, 1),
+        entries=5,
+        backend_factory=functools.partial(JSONBackend, b64_encode=False),
+        encryptor_cls=loadtest.PlainEncryptor,
+    )
+    assert report.total_ops == 30
+    assert report.ops["get"] >= 10
+    assert sum(report.errors.values()) == 0
+    assert report.lost_writes >= 0
+    assert report.ops_per_sec > 0
+    assert "lost writes:" in report.format()
+
+
+def test_run_refuses_existing_safe(tmp_path: pathlib.Path):
+    backend = JSONBackend(tmp_path, b64_encode=False)
+    backend.save(loadtest.SAFE_NAME, {})
+    with pytest.raises(IronVaultError):
+        loadtest.run(
+            tmp_path,
+            backend_factory=functools.partial(JSONBackend, b64_encode=False),
+            encryptor_cls=loadtest.PlainEncryptor,
+        )
+    assert backend.load(loadtest.SAFE_NAME) == {}
+
+
+def test_run_worker_crash(tmp_path: pathlib.Path):
+    with pytest.raises(IronVaultError, match="crashed"):
+        loadtest.run(
+            tmp_path,
+            readers=1,
+            writers=1,
+            backend_factory=ChildBrokenBackend(os.getpid()),
+            encryptor_cls=loadtest.PlainEncryptor,
+            timeout=60,
+        )
+    assert multiprocessing.active_children() == []
+
+
+def test_run_unpicklable_factory(tmp_path: pathlib.Path):
+    with pytest.raises(Exception):
+        loadtest.run(
+            tmp_path,
+            readers=2,
+            writers=0,
+            backend_factory=lambda path: JSONBackend(path, b64_encode=False),
+            encryptor_cls=loadtest.PlainEncryptor,
+        )
+    assert multiprocessing.active_children() == []
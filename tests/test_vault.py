@@ -1,3 +1,4 @@
+import os
 import pathlib
 import dataclasses
 import pytest
@@ -5,6 +6,8 @@ import unittest.mock
 import unittest
 
 import iron_vt
+import iron_vt.vault
+import iron_vt.backend.json_backend
 
 
 @dataclasses.dataclass
@@ -190,3 +193,251 @@ def test_delete():
 
     with pytest.raises(iron_vt.IronVaultError):
         del safe["flaf"]
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma", None])
+def test_vault_compressed_roundtrip(tmp_path: pathlib.Path, compression: str):
+    pem = "-----BEGIN CERTIFICATE-----\n" + "MIIDdzCCAl+gAwIBAgIE\n" * 200
+    vault = iron_vt.Vault(tmp_path, b64_encode=False, compression=compression)
+    safe = vault.create("certs")
+    safe.add("pem", pem)
+    safe.add("short", "SECRET_A")
+    vault.save(safe, "mykey")
+
+    saved = tmp_path.joinpath("certs.json").read_text()
+    assert saved.count('"compression"') == (0 if compression is None else 1)
+    assert iron_vt.Vault(tmp_path, b64_encode=False).load("certs", "mykey") == safe
+
+
+def test_vault_compression_off_by_default(tmp_path: pathlib.Path):
+    vault = iron_vt.Vault(tmp_path, b64_encode=False)
+    safe = vault.create("certs")
+    safe.add("pem", "MIIDdzCCAl+gAwIBAgIE\n" * 200)
+    vault.save(safe, "mykey")
+    assert '"compression"' not in tmp_path.joinpath("certs.json").read_text()
+
+
+@pytest.fixture
+def path_safe():
+    s = iron_vt.Safe("paths")
+    for name in ["db/prod/password", "db/prod/user", "db/dev/password", "api/key"]:
+        s.add(name, name.upper())
+    s.add("api/stripe/key", "STRIPE")
+    s.add("apiary", "BEES")
+    s.add("db/prod/replica/password", "REPLICA")
+    return s
+
+
+def test_safe_subtree(path_safe: iron_vt.Safe):
+    assert path_safe.subtree("api/") == {
+        "api/key": "API/KEY",
+        "api/stripe/key": "STRIPE",
+    }
+    assert list(path_safe.subtree("db/")) == [
+        "db/dev/password",
+        "db/prod/password",
+        "db/prod/replica/password",
+        "db/prod/user",
+    ]
+    assert path_safe.subtree("nothing/") == {}
+    assert len(path_safe.subtree("")) == 7
+
+
+@pytest.mark.parametrize(
+    "pattern,want",
+    [
+        ("db/prod/*", ["db/prod/password", "db/prod/user"]),
+        ("db/*/password", ["db/dev/password", "db/prod/password"]),
+        ("api*", ["apiary"]),
+        ("api/key", ["api/key"]),
+        ("api/nokey", []),
+        ("*/key", ["api/key"]),
+        ("**/key", ["api/key", "api/stripe/key"]),
+        (
+            "db/**/password",
+            ["db/dev/password", "db/prod/password", "db/prod/replica/password"],
+        ),
+        (
+            "db/prod/**",
+            ["db/prod/password", "db/prod/replica/password", "db/prod/user"],
+        ),
+    ],
+)
+def test_safe_find(path_safe: iron_vt.Safe, pattern: str, want: list):
+    assert list(path_safe.find(pattern)) == want
+
+
+def test_safe_index_follows_changes(path_safe: iron_vt.Safe):
+    del path_safe["db/prod/user"]
+    path_safe["db/prod/host"] = "HOST"
+    path_safe["db/prod/password"] = "NEW"
+    assert path_safe.find("db/prod/*") == {
+        "db/prod/host": "HOST",
+        "db/prod/password": "NEW",
+    }
+    assert list(path_safe.entries)[-1] == "db/prod/host"
+
+
+class CountingList(list):
+    reads = 0
+
+    def __getitem__(self, i):
+        self.reads += 1
+        return super().__getitem__(i)
+
+
+@pytest.mark.parametrize(
+    "query,want",
+    [
+        (lambda entries: entries.glob("svc04242/*/key"), 5),
+        (lambda entries: entries.prefix("svc04242/"), 5),
+        (lambda entries: entries.glob("svc0424*/env1/key"), 10),
+        (lambda entries: entries.glob("svc04242/env3/key"), 1),
+    ],
+)
+def test_entry_index_scans_only_matches(query, want: int):
+    entries = iron_vt.vault.EntryIndex(
+        (f"svc{i:05}/env{j}/key", b"x") for i in range(10000) for j in range(5)
+    )
+    names = CountingList(entries._names)  # type: ignore
+    entries._names = names  # type: ignore
+    assert len(list(query(entries))) == want
+    # a bisect over 50k names plus one read per candidate and one to stop
+    assert names.reads <= 2 * 16 + 5 * want + 1
+
+
+def test_vault_find_decrypts_matches(path_safe: iron_vt.Safe):
+    encrypted = {
+        name: iron_vt.vault.Entry(salt=b"", token=secret)
+        for name, secret in path_safe.entries.items()
+    }
+    backend = unittest.mock.Mock()
+    backend.load.return_value = encrypted
+    encryptor = unittest.mock.Mock()
+    encryptor.return_value.decrypt.side_effect = lambda entry: entry.token
+    vault = iron_vt.vault.BaseVault(backend, encryptor)
+
+    assert vault.find("paths", "mykey", "db/prod/*") == {
+        "db/prod/password": "DB/PROD/PASSWORD",
+        "db/prod/user": "DB/PROD/USER",
+    }
+    assert encryptor.return_value.decrypt.call_count == 2
+
+    assert vault.subtree("paths", "mykey", "api/") == {
+        "api/key": "API/KEY",
+        "api/stripe/key": "STRIPE",
+    }
+    assert encryptor.return_value.decrypt.call_count == 4
+
+
+def test_vault_find_checks_key(keyed_vault: iron_vt.vault.BaseVault):
+    assert keyed_vault.subtree("a", "old", "zzz") == {}
+    assert keyed_vault.find("a", "old", "zzz/*") == {}
+    with pytest.raises(iron_vt.IronVaultError):
+        keyed_vault.subtree("a", "wrong", "zzz")
+    with pytest.raises(iron_vt.IronVaultError):
+        keyed_vault.find("a", "wrong", "zzz/*")
+
+
+@dataclasses.dataclass
+class KeyedEncryptor:
+    """Cheap stand-in for FernetEncryptor that only checks the key."""
+
+    key: bytes
+
+    def decrypt(self, entry: iron_vt.vault.Entry):
+        if entry.salt != self.key:
+            raise ValueError("wrong key")
+        return entry.token
+
+    def encrypt(self, secret: bytes):
+        return iron_vt.vault.Entry(salt=self.key, token=secret)
+
+
+@pytest.fixture
+def keyed_vault(tmp_path: pathlib.Path):
+    backend = iron_vt.backend.json_backend.JSONBackend(tmp_path, b64_encode=False)
+    vault = iron_vt.vault.BaseVault(backend, KeyedEncryptor, "zlib")
+    for name in ["a", "b", "c"]:
+        safe = vault.create(name)
+        safe.add("short", f"SECRET_{name}")
+        safe.add("long", name * 4096)
+        vault.save(safe, "old")
+    return vault
+
+
+def test_rekey(keyed_vault: iron_vt.vault.BaseVault):
+    want = keyed_vault.load("a", "old")
+    keyed_vault.rekey("a", "old", "new", workers=2)
+    assert keyed_vault.load("a", "new") == want
+    assert keyed_vault._backend.load("a")["long"].compression == "zlib"
+    with pytest.raises(iron_vt.IronVaultError):
+        keyed_vault.load("a", "old")
+    with pytest.raises(iron_vt.IronVaultError):
+        keyed_vault.rekey("a", "old", "newer")
+
+
+def test_rekey_keeps_mode(tmp_path: pathlib.Path, keyed_vault: iron_vt.vault.BaseVault):
+    path = tmp_path / "a.json"
+    os.chmod(path, 0o600)
+    keyed_vault.save(keyed_vault.load("a", "old"), "old")
+    assert path.stat().st_mode & 0o777 == 0o600
+    keyed_vault.rekey("a", "old", "new")
+    assert path.stat().st_mode & 0o777 == 0o600
+
+
+def test_rekey_all(tmp_path: pathlib.Path, keyed_vault: iron_vt.vault.BaseVault):
+    journal = tmp_path / ".rekey.journal"
+    assert keyed_vault.rekey_all("old", "new", journal=journal) == ["a", "b", "c"]
+    assert not journal.exists()
+    for name in ["a", "b", "c"]:
+        assert keyed_vault.load(name, "new")["short"] == f"SECRET_{name}"
+
+
+def test_rekey_all_resume(tmp_path: pathlib.Path, keyed_vault: iron_vt.vault.BaseVault):
+    # "a" finished and was journaled, "b" was saved but the run died before
+    # it was journaled, "c" was never reached
+    journal = tmp_path / ".rekey.journal"
+    keyed_vault.rekey("a", "old", "new")
+    keyed_vault.rekey("b", "old", "new")
+    journal.write_text("a\n")
+
+    assert keyed_vault.rekey_all("old", "new", journal=journal) == ["c"]
+    assert not journal.exists()
+    for name in ["a", "b", "c"]:
+        assert keyed_vault.load(name, "new")["short"] == f"SECRET_{name}"
+
+
+def test_rekey_all_stale_journal(
+    tmp_path: pathlib.Path, keyed_vault: iron_vt.vault.BaseVault
+):
+    # left by a failed run towards another key, "a" and "b" are still "old"
+    journal = tmp_path / ".rekey.journal"
+    journal.write_text("a\nb\n")
+
+    assert keyed_vault.rekey_all("old", "new", journal=journal) == ["a", "b", "c"]
+    assert not journal.exists()
+    for name in ["a", "b", "c"]:
+        assert keyed_vault.load(name, "new")["short"] == f"SECRET_{name}"
+
+
+def test_rekey_all_wrong_key(
+    tmp_path: pathlib.Path, keyed_vault: iron_vt.vault.BaseVault
+):
+    journal = tmp_path / ".rekey.journal"
+    with pytest.raises(iron_vt.IronVaultError):
+        keyed_vault.rekey_all("wrong", "new", journal=journal)
+    assert keyed_vault.load("a", "old")["short"] == "SECRET_a"
+
+
+def test_vault_uses_backend_index(tmp_path: pathlib.Path):
+    backend = iron_vt.backend.json_backend.JSONBackend(tmp_path)
+    backend.save("paths", {"db/prod/password": iron_vt.vault.Entry(b"1", b"2")})
+    vault = iron_vt.vault.BaseVault(backend, KeyedEncryptor)
+    encrypted_entries = backend.load("paths")
+    with (
+        unittest.mock.patch.object(backend, "load", return_value=encrypted_entries),
+        unittest.mock.patch("iron_vt.vault.EntryIndex.__init__") as mock_init,
+    ):
+        assert vault._load_index("paths") is encrypted_entries  # type: ignore
+    mock_init.assert_not_called()